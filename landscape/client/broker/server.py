@@ -43,14 +43,26 @@ Diagram::
 
 """
 import logging
+import sys
+from functools import partial
 
 from twisted.internet.defer import Deferred
+from twisted.internet.defer import DeferredList
+from twisted.internet.defer import succeed
 
 from landscape.client.amp import remote
 from landscape.client.manager.manager import FAILED
 from landscape.lib.compat import _PY3
 from landscape.lib.twisted_util import gather_results
 
+_UNHANDLED_TEMPLATE = """\
+Landscape client failed to handle this request (%s) because the
+plugin which should handle it isn't available.  This could mean that the
+plugin has been intentionally disabled, or that the client isn't running
+properly, or you may be running an older version of the client that doesn't
+support this feature.
+"""
+
 
 def event(method):
     """Turns a L{BrokerServer} method into an event broadcaster.
@@ -59,12 +71,22 @@ def event(method):
     clients. The event will have the same name as the method being called,
     except that any underscore in the method name will be replaced with a dash.
     """
-    event_type = method.__name__.replace("_", "-")
+    event_type = sys.intern(method.__name__.replace("_", "-"))
 
     def broadcast_event(self, *args, **kwargs):
-        fired = []
-        for client in self.get_clients():
-            fired.append(client.fire_event(event_type, *args, **kwargs))
+        # Most of the time there are zero or one clients registered, so skip
+        # the DeferredList machinery for those cases.
+        clients = self._client_tuple
+        if not clients:
+            return succeed([])
+        if len(clients) == 1:
+            [client] = clients
+            fired = client.fire_event(event_type, *args, **kwargs)
+            return fired.addCallback(lambda result: [result])
+        fired = [
+            client.fire_event(event_type, *args, **kwargs)
+            for client in clients
+        ]
         return gather_results(fired)
 
     return broadcast_event
@@ -83,6 +105,18 @@ class BrokerServer:
     """
 
     name = "broker"
+    _component_registry = None
+
+    # Reactor events the broker handles, mapped to the name of the method
+    # handling them.
+    _reactor_events = (
+        ("message", "broadcast_message"),
+        ("impending-exchange", "impending_exchange"),
+        ("message-type-acceptance-changed", "message_type_acceptance_changed"),
+        ("server-uuid-changed", "server_uuid_changed"),
+        ("package-data-changed", "package_data_changed"),
+        ("resynchronize-clients", "resynchronize"),
+    )
 
     def __init__(
         self,
@@ -93,27 +127,26 @@ class BrokerServer:
         message_store,
         pinger,
     ):
-        from landscape.client.broker.amp import get_component_registry
+        if BrokerServer._component_registry is None:
+            # Imported here to avoid a circular import with broker.amp.
+            from landscape.client.broker.amp import get_component_registry
+
+            BrokerServer._component_registry = get_component_registry()
 
-        self.connectors_registry = get_component_registry()
+        self.connectors_registry = BrokerServer._component_registry
         self._config = config
         self._reactor = reactor
         self._exchanger = exchange
         self._registration = registration
         self._message_store = message_store
         self._registered_clients = {}
+        self._client_tuple = ()
         self._connectors = {}
+        self._connectors_by_name = {}
         self._pinger = pinger
 
-        reactor.call_on("message", self.broadcast_message)
-        reactor.call_on("impending-exchange", self.impending_exchange)
-        reactor.call_on(
-            "message-type-acceptance-changed",
-            self.message_type_acceptance_changed,
-        )
-        reactor.call_on("server-uuid-changed", self.server_uuid_changed)
-        reactor.call_on("package-data-changed", self.package_data_changed)
-        reactor.call_on("resynchronize-clients", self.resynchronize)
+        for event_type, method_name in self._reactor_events:
+            reactor.call_on(event_type, getattr(self, method_name))
 
     @remote
     def ping(self):
@@ -161,19 +194,21 @@ class BrokerServer:
 
         @param name: The name of the client, such a C{monitor} or C{manager}.
         """
-        connector_class = self.connectors_registry.get(name)
+        connector_class = self.connectors_registry[name]
         connector = connector_class(self._reactor, self._config)
 
         def register(remote_client):
             self._registered_clients[name] = remote_client
+            self._client_tuple = tuple(self._registered_clients.values())
             self._connectors[remote_client] = connector
+            self._connectors_by_name[name] = connector
 
         connected = connector.connect()
         return connected.addCallback(register)
 
     def get_clients(self):
         """Get L{RemoteClient} instances for registered clients."""
-        return self._registered_clients.values()
+        return self._client_tuple
 
     def get_client(self, name):
         """Return the client with the given C{name} or C{None}."""
@@ -188,7 +223,7 @@ class BrokerServer:
 
     def get_connector(self, name):
         """Return the connector for the given C{name} or C{None}."""
-        return self._connectors.get(self.get_client(name))
+        return self._connectors_by_name.get(name)
 
     @remote
     def send_message(self, message, session_id, urgent=False):
@@ -243,10 +278,10 @@ class BrokerServer:
     @remote
     def stop_clients(self):
         """Tell all the clients to exit."""
-        results = []
+        if not self._client_tuple:
+            return succeed(None)
         # FIXME: check whether the client are still alive
-        for client in self.get_clients():
-            results.append(client.exit())
+        results = [client.exit() for client in self._client_tuple]
         result = gather_results(results, consume_errors=True)
         return result.addCallback(lambda ignored: None)
 
@@ -311,7 +346,7 @@ class BrokerServer:
             # Note that stopping the reactor will cause the Twisted machinery
             # to invoke BrokerService.stopService, which in turn will stop the
             # exchanger/pinger and cleanly close all AMP sockets.
-            self._reactor.call_later(1, lambda: self._reactor.stop())
+            self._reactor.call_later(1, self._reactor.stop)
 
         return clients_stopped.addBoth(schedule_reactor_stop)
 
@@ -329,21 +364,27 @@ class BrokerServer:
         Return a C{Deferred} that fires when the first event occurs among the
         given ones.
         """
-        deferred = Deferred()
         calls = []
+        deferreds = []
 
-        def get_handler(event_type):
-            def handler(**kwargs):
-                for call in calls:
-                    self._reactor.cancel_call(call)
-                deferred.callback((event_type, kwargs))
+        def handler(deferred, event_type, **kwargs):
+            deferred.callback((event_type, kwargs))
 
-            return handler
+        def first_fired(result):
+            for call in calls:
+                self._reactor.cancel_call(call)
+            return result[0]
 
         for event_type in event_types:
-            call = self._reactor.call_on(event_type, get_handler(event_type))
+            deferred = Deferred()
+            call = self._reactor.call_on(
+                event_type,
+                partial(handler, deferred, event_type),
+            )
             calls.append(call)
-        return deferred
+            deferreds.append(deferred)
+        result = DeferredList(deferreds, fireOnOneCallback=True)
+        return result.addCallback(first_fired)
 
     @event
     def broker_reconnect(self):
@@ -366,10 +407,13 @@ class BrokerServer:
 
         @see: L{register_plugin}.
         """
-        results = []
-        for client in self.get_clients():
-            results.append(client.message(message))
-        result = gather_results(results)
+        if not self._client_tuple:
+            result = succeed([])
+        else:
+            results = [
+                client.message(message) for client in self._client_tuple
+            ]
+            result = gather_results(results)
         return result.addCallback(self._message_delivered, message)
 
     def _message_delivered(self, results, message):
@@ -380,23 +424,15 @@ class BrokerServer:
         """
         opid = message.get("operation-id")
         if (
-            True not in results
-            and opid is not None
+            opid is not None
             and message["type"] != "resynchronize"
+            and True not in results
         ):
 
             mtype = message["type"]
-            logging.error(f"Nobody handled the {mtype} message.")
+            logging.error("Nobody handled the %s message.", mtype)
 
-            result_text = """\
-Landscape client failed to handle this request ({}) because the
-plugin which should handle it isn't available.  This could mean that the
-plugin has been intentionally disabled, or that the client isn't running
-properly, or you may be running an older version of the client that doesn't
-support this feature.
-""".format(
-                mtype,
-            )
+            result_text = _UNHANDLED_TEMPLATE % (mtype,)
             response = {
                 "type": "operation-result",
                 "status": FAILED,
@@ -228,6 +228,13 @@ class BrokerServerTest(LandscapeTest):
         client2.exit = Mock(return_value=fail(Exception()))
         return self.assertFailure(self.broker.stop_clients(), Exception)
 
+    def test_stop_clients_without_clients(self):
+        """
+        The L{BrokerServer.stop_clients} method returns a deferred resulting
+        in C{None} if there are no registered clients.
+        """
+        self.assertIsNone(self.successResultOf(self.broker.stop_clients()))
+
     def test_reload_configuration(self):
         """
         The L{BrokerServer.reload_configuration} method forces the config
@@ -377,6 +384,41 @@ class BrokerServerTest(LandscapeTest):
         result = self.broker.exit()
         return result.addCallback(assert_stopped)
 
+    def test_event_without_clients(self):
+        """
+        Broadcasting an event when no clients are registered results in an
+        empty list of results.
+        """
+        result = self.broker.impending_exchange()
+        self.assertEqual([], self.successResultOf(result))
+
+    def test_event_with_single_client(self):
+        """
+        Broadcasting an event to a single registered client results in a list
+        holding that client's result.
+        """
+        self.broker.connectors_registry = {"foo": FakeCreator}
+        self.broker.register_client("foo")
+        [client] = self.broker.get_clients()
+        client.fire_event = Mock(return_value=succeed("bar"))
+        result = self.broker.impending_exchange()
+        self.assertEqual(["bar"], self.successResultOf(result))
+        client.fire_event.assert_called_once_with("impending-exchange")
+
+    def test_broadcast_message_without_clients(self):
+        """
+        When there are no registered clients, an operation-result message
+        indicating a failure is sent back for messages with an operation ID.
+        """
+        self.log_helper.ignore_errors("Nobody handled the foobar message.")
+        self.mstore.set_accepted_types(["operation-result"])
+        message = {"type": "foobar", "operation-id": 4}
+        self.successResultOf(self.broker.broadcast_message(message))
+        [response] = self.mstore.get_pending_messages()
+        self.assertEqual("operation-result", response["type"])
+        self.assertEqual(FAILED, response["status"])
+        self.assertEqual(4, response["operation-id"])
+
     def test_listen_events(self):
         """
         The L{BrokerServer.listen_events} method returns a deferred which is
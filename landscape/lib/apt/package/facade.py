@@ -1,10 +1,12 @@
 import hashlib
 import logging
+import mmap
 import os
 import subprocess
 import sys
 import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor
 from operator import attrgetter
 
 import apt
@@ -16,13 +18,15 @@ from aptsources.sourceslist import SourcesList
 from twisted.python.compat import itervalues
 
 from .skeleton import build_skeleton_apt
+from .skeleton import compute_package_hash
 from landscape.lib.compat import StringIO
 from landscape.lib.fs import append_text_file
 from landscape.lib.fs import create_text_file
-from landscape.lib.fs import read_binary_file
-from landscape.lib.fs import read_text_file
 from landscape.lib.fs import touch_file
 
+# Size of the blocks read from deb files when computing their digests.
+_DEB_CHUNK_SIZE = 64 * 1024
+
 
 class TransactionError(Exception):
     """Raised when the transaction fails to run."""
@@ -141,8 +145,13 @@ class AptFacade:
         # sources.list contains invalid lines (LP: #886208)
         self._cache = apt.cache.Cache(rootdir=root)
         self._channels_loaded = False
+        self._internal_sources_list = None
+        # package.shortname doesn't exist on releases that don't support
+        # multi-arch, so check for it once rather than for every package.
+        self._has_shortname = hasattr(apt.package.Package, "shortname")
         self._pkg2hash = {}
         self._hash2pkg = {}
+        self._name2versions = {}
         self._version_installs = []
         self._package_installs = set()
         self._global_upgrade = False
@@ -186,12 +195,15 @@ class AptFacade:
 
         For Apt, it means all packages that are held.
         """
+        # Check the hold first: it's a plain selection state lookup, while
+        # checking whether a version is installed builds and compares another
+        # Version object, and only few packages are held.
         return [
             version
             for version in self.get_packages()
             if (
-                self.is_package_installed(version)
-                and self._is_package_held(version.package)
+                self._is_package_held(version.package)
+                and self.is_package_installed(version)
             )
         ]
 
@@ -238,11 +250,13 @@ class AptFacade:
             information about the binaries packages that are in the facade's
             internal repo.
         """
-        self._cache.open(None)
         internal_sources_list = self._get_internal_sources_list()
         if self.refetch_package_index or (
             force_reload_binaries and os.path.exists(internal_sources_list)
         ):
+            # Fetching the indexes only needs an up-to-date sources list;
+            # the cache itself gets (re)opened once, after the update.
+            self._cache._list.read_main_list()
 
             # Try to update only the internal repos, if the python-apt
             # version is new enough to accept a sources_list parameter.
@@ -258,23 +272,27 @@ class AptFacade:
                 raise ChannelError(
                     f"Apt failed to reload channels ({self.get_channels()!r})",
                 )
-            self._cache.open(None)
+        self._cache.open(None)
 
         self._pkg2hash.clear()
         self._hash2pkg.clear()
+        # Inline _is_main_architecture(), since this runs for every package.
+        has_shortname = self._has_shortname
         for package in self._cache:
-            if not self._is_main_architecture(package):
+            if has_shortname and package.name != package.shortname:
                 continue
             for version in package.versions:
-                skeleton_hash = self.get_package_skeleton(
-                    version,
-                    with_info=False,
-                ).get_hash()
-                # Use a tuple including the package, since the Version
-                # objects of two different packages can have the same
-                # hash.
-                self._pkg2hash[(package, version)] = skeleton_hash
+                skeleton_hash = compute_package_hash(version)
+                # Key on the Version alone: its equality already takes the
+                # package full name into account, so versions of two
+                # different packages never clash even if their hashes do.
+                self._pkg2hash[version] = skeleton_hash
                 self._hash2pkg[skeleton_hash] = version
+        self._name2versions.clear()
+        for version in self._hash2pkg.values():
+            self._name2versions.setdefault(version.package.name, []).append(
+                version,
+            )
         self._channels_loaded = True
 
     def ensure_channels_reloaded(self):
@@ -289,10 +307,12 @@ class AptFacade:
 
     def _get_internal_sources_list(self):
         """Return the path to the source.list file for the facade channels."""
-        return os.path.join(
-            self._sourceparts_directory,
-            "_landscape-internal-facade.list",
-        )
+        if self._internal_sources_list is None:
+            self._internal_sources_list = os.path.join(
+                self._sourceparts_directory,
+                "_landscape-internal-facade.list",
+            )
+        return self._internal_sources_list
 
     def add_channel_apt_deb(
         self,
@@ -317,9 +337,15 @@ class AptFacade:
         if components:
             sources_line += " {}".format(" ".join(components))
         if os.path.exists(sources_file_path):
-            current_content = read_text_file(sources_file_path).split("\n")
-            if sources_line in current_content:
-                return
+            with open(
+                sources_file_path,
+                encoding="utf-8",
+                errors="replace",
+            ) as sources_file:
+                if any(
+                    line.rstrip("\n") == sources_line for line in sources_file
+                ):
+                    return
         sources_line += "\n"
         append_text_file(sources_file_path, sources_line)
 
@@ -348,14 +374,40 @@ class AptFacade:
             os.remove(sources_file_path)
 
     def _create_packages_file(self, deb_dir):
-        """Create a Packages file in a directory with debs."""
-        packages = sorted(os.listdir(deb_dir))
-        with open(os.path.join(deb_dir, "Packages"), "wb", 0) as dest:
-            for i, filename in enumerate(packages):
-                if i > 0:
-                    dest.write(b"\n")
-                deb_file = os.path.join(deb_dir, filename)
-                self.write_package_stanza(deb_file, dest)
+        """Create a Packages file in a directory with debs.
+
+        Only the files with a C{.deb} extension are considered.
+        """
+        # The entries' file type comes from the directory listing itself,
+        # and the size of each deb is read from its open file later on, so
+        # the debs aren't stat()ed separately.
+        with os.scandir(deb_dir) as entries:
+            deb_paths = [
+                entry.path
+                for entry in sorted(entries, key=attrgetter("name"))
+                if entry.name.endswith(".deb") and entry.is_file()
+            ]
+        # Write to a temporary file first, so that apt never sees a
+        # partially written Packages file.
+        packages_path = os.path.join(deb_dir, "Packages")
+        temp_path = packages_path + ".tmp"
+        # Reading and digesting the debs is independent for each of them,
+        # so do it concurrently. The stanzas are written in order as they
+        # come in, rather than holding all of them in memory first.
+        with ThreadPoolExecutor() as executor:
+            stanzas = executor.map(self._get_package_stanza_tags, deb_paths)
+            try:
+                with open(temp_path, "wb", 0) as dest:
+                    for i, (control, new_tags) in enumerate(stanzas):
+                        if i > 0:
+                            dest.write(b"\n")
+                        self._write_stanza(control, new_tags, dest)
+            except BaseException:
+                # Don't leave the partially written file behind.
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+        os.replace(temp_path, packages_path)
 
     def get_channels(self):
         """Return a list of channels configured.
@@ -397,24 +449,56 @@ class AptFacade:
         @param deb_path: The path to the deb package.
         @param dest: A writable package file.
         """
-        deb_file = open(deb_path)
-        deb = apt_inst.DebFile(deb_file)
-        control = deb.control.extractdata("control")
-        deb_file.close()
+        control, new_tags = self._get_package_stanza_tags(deb_path)
+        self._write_stanza(control, new_tags, dest)
+
+    def _get_package_stanza_tags(self, deb_path):
+        """Read the control data of a deb and compute its index tags.
+
+        @param deb_path: The path to the deb package.
+        @return: A tuple of the raw control data and the list of
+            C{(name, value)} tags to add to it in a Packages file.
+        """
+        md5 = hashlib.md5()
+        sha1 = hashlib.sha1()
+        sha256 = hashlib.sha256()
+        with open(deb_path, "rb") as deb_file:
+            deb = apt_inst.DebFile(deb_file)
+            control = deb.control.extractdata("control")
+            size = os.fstat(deb_file.fileno()).st_size
+            # Compute all the digests in a single pass over a read-only
+            # mapping of the file, so its content is never copied into
+            # user space.
+            with mmap.mmap(
+                deb_file.fileno(),
+                0,
+                access=mmap.ACCESS_READ,
+            ) as mapping:
+                mapping.madvise(mmap.MADV_SEQUENTIAL)
+                with memoryview(mapping) as view:
+                    for offset in range(0, size, _DEB_CHUNK_SIZE):
+                        with view[offset : offset + _DEB_CHUNK_SIZE] as chunk:
+                            md5.update(chunk)
+                            sha1.update(chunk)
+                            sha256.update(chunk)
         filename = os.path.basename(deb_path)
-        size = os.path.getsize(deb_path)
-        contents = read_binary_file(deb_path)
-        md5 = hashlib.md5(contents).hexdigest()
-        sha1 = hashlib.sha1(contents).hexdigest()
-        sha256 = hashlib.sha256(contents).hexdigest()
-        tag_section = apt_pkg.TagSection(control)
         new_tags = [
             ("Filename", filename),
             ("Size", str(size)),
-            ("MD5sum", md5),
-            ("SHA1", sha1),
-            ("SHA256", sha256),
+            ("MD5sum", md5.hexdigest()),
+            ("SHA1", sha1.hexdigest()),
+            ("SHA256", sha256.hexdigest()),
         ]
+        return control, new_tags
+
+    def _write_stanza(self, control, new_tags, dest):
+        """Write a stanza to a Packages file.
+
+        @param control: The raw control data of the deb package.
+        @param new_tags: The C{(name, value)} tags to add to the control data.
+        @param dest: A writable package file.
+        """
+        tag_section = apt_pkg.TagSection(control)
         try:
             tag_section.write(
                 dest,
@@ -472,7 +556,7 @@ class AptFacade:
 
         @param version: an L{apt.package.Version} object.
         """
-        return self._pkg2hash.get((version.package, version))
+        return self._pkg2hash.get(version)
 
     def get_package_hashes(self):
         """Get the hashes of all the packages available in the channels."""
@@ -497,9 +581,12 @@ class AptFacade:
 
     def is_package_upgrade(self, version):
         """Is the package an upgrade for another installed package?"""
-        if not version.package.is_upgradable or not version.package.installed:
+        package = version.package
+        # Package.installed creates a new Version object on each access.
+        installed = package.installed
+        if installed is None or not package.is_upgradable:
             return False
-        return version > version.package.installed
+        return version > installed
 
     def is_package_autoremovable(self, version):
         """Was the package auto-installed, but isn't required anymore?"""
@@ -509,9 +596,8 @@ class AptFacade:
         """Is the package for the facade's main architecture?"""
         # package.name includes the architecture, if it's for a foreign
         # architectures. package.shortname never includes the
-        # architecture. package.shortname doesn't exist on releases that
-        # don't support multi-arch, though.
-        if not hasattr(package, "shortname"):
+        # architecture.
+        if not self._has_shortname:
             return True
         return package.name == package.shortname
 
@@ -524,11 +610,7 @@ class AptFacade:
 
         @param name: The name the returned packages should have.
         """
-        return [
-            version
-            for version in self.get_packages()
-            if version.package.name == name
-        ]
+        return list(self._name2versions.get(name, ()))
 
     def _is_package_broken(self, package):
         """Is the package broken?
@@ -553,10 +635,15 @@ class AptFacade:
 
     def _get_broken_packages(self):
         """Return the packages that are in a broken state."""
+        if self._cache._depcache.broken_count == 0:
+            # No package is install-broken, so only the packages we marked
+            # for install that apt unmarked again can be broken.
+            packages = self._package_installs
+        else:
+            # Check each package once, rather than once per version.
+            packages = {version.package for version in self.get_packages()}
         return {
-            version.package
-            for version in self.get_packages()
-            if self._is_package_broken(version.package)
+            package for package in packages if self._is_package_broken(package)
         }
 
     def _get_changed_versions(self, package):
@@ -567,11 +654,15 @@ class AptFacade:
         need to convert that into a list of versions that will be either
         installed or removed, which is what the server expects to get.
         """
-        if package.marked_install:
+        # Query the depcache directly, rather than going through the
+        # package properties, which look it up again for every check.
+        depcache = self._cache._depcache
+        pkg = package._pkg
+        if depcache.marked_install(pkg):
             return [package.candidate]
-        if package.marked_upgrade or package.marked_downgrade:
+        if depcache.marked_upgrade(pkg) or depcache.marked_downgrade(pkg):
             return [package.installed, package.candidate]
-        if package.marked_delete:
+        if depcache.marked_delete(pkg):
             return [package.installed]
         return None
 
@@ -586,9 +677,9 @@ class AptFacade:
         # Build tuples of (package, version) so that we can do
         # comparison checks. Same versions of different packages compare
         # as being the same, so we need to include the package as well.
-        all_changes = [
+        all_changes = {
             (version.package, version) for version in requested_changes
-        ]
+        }
         versions_to_be_changed = set()
         for package in self._cache.get_changes():
             if not self._is_main_architecture(package):
@@ -665,8 +756,12 @@ class AptFacade:
             candidate = next(
                 v._cand for v in self._version_installs if v.package == package
             )
+            # depends_list builds a new dict on every access.
+            depends_list = candidate.depends_list
             for dep_type in ["PreDepends", "Depends", "Conflicts", "Breaks"]:
-                dependencies = candidate.depends_list.get(dep_type, [])
+                dependencies = depends_list.get(dep_type, [])
+                info = f"  {package.name}: {dep_type}: "
+                or_divider = " or\n" + " " * len(info)
                 for dependency in dependencies:
                     if self._is_dependency_satisfied(dependency, dep_type):
                         continue
@@ -675,8 +770,6 @@ class AptFacade:
                         relation_infos.append(
                             self._get_unmet_relation_info(dep_relation),
                         )
-                    info = f"  {package.name}: {dep_type}: "
-                    or_divider = " or\n" + " " * len(info)
                     all_info.append(info + or_divider.join(relation_infos))
                     found_dependency_error = True
             if not found_dependency_error:
@@ -732,11 +825,20 @@ class AptFacade:
                 ),
             )
 
-        for version in self._version_hold_creations:
-            self.set_package_hold(version)
-
-        for version in self._version_hold_removals:
-            self.remove_package_hold(version)
+        # Change all the selections with a single dpkg call, rather than
+        # running dpkg once per package.
+        selections = [
+            version.package.name + " hold"
+            for version in self._version_hold_creations
+        ]
+        selections.extend(
+            version.package.name + " install"
+            for version in self._version_hold_removals
+            if self.is_package_installed(version)
+            and self._is_package_held(version.package)
+        )
+        if selections:
+            self._set_dpkg_selections("\n".join(selections))
 
         return "Package holds successfully changed."
 
@@ -758,6 +860,7 @@ class AptFacade:
         os.dup2(fd, 1)
         os.dup2(fd, 2)
         install_progress = LandscapeInstallProgress()
+        error = None
         try:
             # Since others (charms) might be installing packages on this system
             # We need to retry a bit in case dpkg is locked in progress
@@ -784,39 +887,33 @@ class AptFacade:
                     if not install_progress.dpkg_exited:
                         raise SystemError("dpkg didn't exit cleanly.")
                 except SystemError as exc:
-                    result_text = fetch_output.getvalue() + read_text_file(
-                        install_output_path,
-                    )
-                    error = TransactionError(
-                        exc.args[0]
-                        + "\n\nPackage operation log:\n"
-                        + result_text,
-                    )
+                    error = exc.args[0]
                     # No need to retry SystemError, since it's most
                     # likely a permanent error.
                     break
                 except apt.cache.LockFailedException as exception:
-                    result_text = fetch_output.getvalue() + read_text_file(
-                        install_output_path,
-                    )
-                    error = TransactionError(
-                        exception.args[0]
-                        + "\n\nPackage operation log:\n"
-                        + result_text,
-                    )
+                    error = exception.args[0]
                 else:
-                    result_text = fetch_output.getvalue() + read_text_file(
-                        install_output_path,
-                    )
                     break
-            if error is not None:
-                raise error
         finally:
             # Restore stdout and stderr.
             os.dup2(old_stdout, 1)
             os.dup2(old_stderr, 2)
+            # Read the output of all the attempts back once, through the
+            # descriptor we already hold, rather than reopening the file.
+            os.lseek(fd, 0, os.SEEK_SET)
+            with os.fdopen(fd, "rb") as install_output:
+                output = install_output.read()
             os.remove(install_output_path)
 
+        result_text = fetch_output.getvalue() + output.decode(
+            "utf-8",
+            "replace",
+        )
+        if error is not None:
+            raise TransactionError(
+                error + "\n\nPackage operation log:\n" + result_text,
+            )
         return result_text
 
     def _preprocess_installs(self, fixer):
@@ -846,32 +943,30 @@ class AptFacade:
             fixer.protect(version.package._pkg)
 
     def _preprocess_removes(self, fixer):
+        if not self._version_removals:
+            return
+
         held_package_names = set()
 
         package_installs = {
             version.package for version in self._version_installs
         }
 
-        package_upgrades = {
-            version.package
-            for version in self._version_removals
-            if version.package in package_installs
-        }
-
         for version in self._version_removals:
-            if self._is_package_held(version.package):
-                held_package_names.add(version.package.name)
-            if version.package in package_upgrades:
+            package = version.package
+            if self._is_package_held(package):
+                held_package_names.add(package.name)
+            if package in package_installs:
                 # The server requests the old version to be removed for
                 # upgrades, since Smart worked that way. For Apt we have
                 # to take care not to mark upgraded packages for  removal.
                 continue
-            version.package.mark_delete(auto_fix=False)
+            package.mark_delete(auto_fix=False)
             # Configure the resolver in the same way
             # mark_delete(auto_fix=True) would have done.
-            fixer.clear(version.package._pkg)
-            fixer.protect(version.package._pkg)
-            fixer.remove(version.package._pkg)
+            fixer.clear(package._pkg)
+            fixer.protect(package._pkg)
+            fixer.remove(package._pkg)
             try:
                 # obsoleted in python-apt 1.9
                 fixer.install_protect()
@@ -1,4 +1,4 @@
-import apt
+from apt.package import Dependency
 
 from landscape.lib.compat import _PY3
 from landscape.lib.compat import unicode
@@ -32,6 +32,8 @@ class PackageSkeleton:
     size = None
     installed_size = None
     _hash = None
+    # The relations list object that is known to be sorted already.
+    _sorted_relations = None
 
     def __init__(self, type, name, version):
         self.type = type
@@ -41,6 +43,7 @@ class PackageSkeleton:
 
     def add_relation(self, type, info):
         self.relations.append((type, info))
+        self._sorted_relations = None
 
     def get_hash(self):
         """Calculate the package hash.
@@ -50,16 +53,9 @@ class PackageSkeleton:
         """
         if self._hash is not None:
             return self._hash
-        # We use ascii here as encoding  for backwards compatibility as it was
-        # default encoding for conversion from unicode to bytes in Python 2.7.
-        package_info = (f"[{self.type:d} {self.name} {self.version}]").encode(
-            "ascii",
-        )
-        digest = sha1(package_info)
-        self.relations.sort()
-        for pair in self.relations:
-            digest.update((f"[{pair[0]:d} {pair[1]}]").encode("ascii"))
-        return digest.digest()
+        if self.relations is not self._sorted_relations:
+            self.relations.sort()
+        return _get_hash(self.type, self.name, self.version, self.relations)
 
     def set_hash(self, package_hash):
         """Set the hash to an explicit value.
@@ -74,6 +70,21 @@ class PackageSkeleton:
         self._hash = package_hash
 
 
+def _get_hash(type, name, version, relations):
+    """Calculate the hash of a package from its sorted relations."""
+    # We use ascii here as encoding  for backwards compatibility as it was
+    # default encoding for conversion from unicode to bytes in Python 2.7.
+    package_info = (f"[{type:d} {name} {version}]").encode("ascii")
+    digest = sha1(package_info)
+    # Hashing the concatenated relations in one go gives the same digest
+    # as updating it with each relation in turn, with a single call.
+    relations_info = "".join(
+        [f"[{relation_type:d} {info}]" for relation_type, info in relations],
+    )
+    digest.update(relations_info.encode("ascii"))
+    return digest.digest()
+
+
 def relation_to_string(relation_tuple):
     """Convert an apt relation to a string representation.
 
@@ -107,22 +118,21 @@ def parse_record_dependencies(
     """
 
     # Prepare list of dependencies
-    relations = set()
+    relations = []
     for dependency in dependencies:
 
         # Process dependency
-        depend = []
-        if isinstance(dependency, apt.package.Dependency):
-            for basedependency in dependency:
-                depend.append(
-                    (
-                        basedependency.name,
-                        basedependency.version,
-                        basedependency.relation,
-                    ),
+        if isinstance(dependency, Dependency):
+            depend = [
+                (
+                    basedependency.name,
+                    basedependency.version,
+                    basedependency.relation,
                 )
+                for basedependency in dependency
+            ]
         else:
-            depend.append((dependency, "", ""))
+            depend = [(dependency, "", "")]
 
         # Process relations
         value_strings = [relation_to_string(relation) for relation in depend]
@@ -130,11 +140,56 @@ def parse_record_dependencies(
         if len(value_strings) > 1:
             value_relation_type = or_relation_type
         relation_string = " | ".join(value_strings)
-        relations.add((value_relation_type, relation_string))
+        relations.append((value_relation_type, relation_string))
 
     return relations
 
 
+def _get_relations_apt(version, name, version_string):
+    """Return the sorted skeleton relations of an apt package version."""
+    # Collect the relations in a list and only deduplicate them once, when
+    # sorting, rather than building and merging a set for each field.
+    relations = []
+
+    # Provides are plain package names, so there's no need to go through
+    # parse_record_dependencies() and its per-item type check for them.
+    relations.extend((DEB_PROVIDES, provided) for provided in version.provides)
+    relations.append((DEB_NAME_PROVIDES, f"{name} = {version_string}"))
+    # Fetch the dependency types that map to the same relation together,
+    # since get_dependencies() rebuilds the version's whole dependency
+    # list on every call.
+    relations.extend(
+        parse_record_dependencies(
+            version.get_dependencies("PreDepends", "Depends"),
+            DEB_REQUIRES,
+            DEB_OR_REQUIRES,
+        ),
+    )
+
+    relations.append((DEB_UPGRADES, f"{name} < {version_string}"))
+
+    relations.extend(
+        parse_record_dependencies(
+            version.get_dependencies("Conflicts", "Breaks"),
+            DEB_CONFLICTS,
+        ),
+    )
+    return sorted(set(relations))
+
+
+def compute_package_hash(version):
+    """Calculate the skeleton hash of an apt package.
+
+    This gives the same hash as C{build_skeleton_apt(version).get_hash()},
+    without creating a L{PackageSkeleton}.
+
+    @param version: An instance of C{apt.package.Version}
+    """
+    name, version_string = version.package.name, version.version
+    relations = _get_relations_apt(version, name, version_string)
+    return _get_hash(DEB_PACKAGE, name, version_string, relations)
+
+
 def build_skeleton_apt(version, with_info=False, with_unicode=False):
     """Build a package skeleton from an apt package.
 
@@ -148,55 +203,17 @@ def build_skeleton_apt(version, with_info=False, with_unicode=False):
     if with_unicode:
         name, version_string = unicode(name), unicode(version_string)
     skeleton = PackageSkeleton(DEB_PACKAGE, name, version_string)
-    relations = set()
-
-    relations.update(parse_record_dependencies(version.provides, DEB_PROVIDES))
-    relations.add(
-        (
-            DEB_NAME_PROVIDES,
-            f"{version.package.name} = {version.version}",
-        ),
-    )
-    relations.update(
-        parse_record_dependencies(
-            version.get_dependencies("PreDepends"),
-            DEB_REQUIRES,
-            DEB_OR_REQUIRES,
-        ),
-    )
-    relations.update(
-        parse_record_dependencies(
-            version.get_dependencies("Depends"),
-            DEB_REQUIRES,
-            DEB_OR_REQUIRES,
-        ),
-    )
-
-    relations.add(
-        (DEB_UPGRADES, f"{version.package.name} < {version.version}"),
-    )
-
-    relations.update(
-        parse_record_dependencies(
-            version.get_dependencies("Conflicts"),
-            DEB_CONFLICTS,
-        ),
-    )
-    relations.update(
-        parse_record_dependencies(
-            version.get_dependencies("Breaks"),
-            DEB_CONFLICTS,
-        ),
-    )
-    skeleton.relations = sorted(relations)
+    skeleton.relations = _get_relations_apt(version, name, version_string)
+    skeleton._sorted_relations = skeleton.relations
 
     if with_info:
         skeleton.section = version.section
         skeleton.summary = version.summary
         skeleton.description = version.description
         skeleton.size = version.size
-        if version.installed_size > 0:
-            skeleton.installed_size = version.installed_size
+        installed_size = version.installed_size
+        if installed_size > 0:
+            skeleton.installed_size = installed_size
         if with_unicode and not _PY3:
             skeleton.section = skeleton.section.decode("utf-8")
             skeleton.summary = skeleton.summary.decode("utf-8")
@@ -157,7 +157,7 @@ class AptFacadeHelper:
         for version in facade.get_packages_by_name(package_name):
             skeleton = facade.get_package_skeleton(version, with_info=False)
             hash = skeleton.get_hash()
-            facade._pkg2hash[(version.package, version)] = hash
+            facade._pkg2hash[version] = hash
             hash_ids[hash] = version.package.id
         store.set_hash_ids(hash_ids)
 
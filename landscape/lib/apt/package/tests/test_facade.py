@@ -520,6 +520,50 @@ class AptFacadeTest(
         expected_contents = "\n".join(stanzas)
         self.assertEqual(expected_contents, packages_contents)
 
+    def test_add_channel_deb_dir_ignores_non_deb_files(self):
+        """
+        C{add_channel_deb_dir} only reads the C{.deb} files of the
+        directory, so that a Packages file left over from a previous call,
+        or a directory, isn't mistaken for a package.
+        """
+        deb_dir = self.makeDir()
+        create_simple_repository(deb_dir)
+        self.facade.add_channel_deb_dir(deb_dir)
+        self.makeFile(dirname=deb_dir, basename="README", content="")
+        os.mkdir(os.path.join(deb_dir, "directory.deb"))
+        self.facade.add_channel_deb_dir(deb_dir)
+        self.facade.reload_channels()
+        self.assertEqual(
+            ["name1", "name2", "name3"],
+            sorted(
+                version.package.name for version in self.facade.get_packages()
+            ),
+        )
+
+    def test_add_channel_deb_dir_removes_temporary_file_on_error(self):
+        """
+        If writing the Packages file fails, C{add_channel_deb_dir} removes
+        the partially written temporary file and leaves the previous
+        Packages file untouched.
+        """
+        deb_dir = self.makeDir()
+        create_simple_repository(deb_dir)
+        self.facade.add_channel_deb_dir(deb_dir)
+        packages_path = os.path.join(deb_dir, "Packages")
+        packages_contents = read_text_file(packages_path)
+        with mock.patch.object(
+            self.facade,
+            "_write_stanza",
+            side_effect=OSError("No space left on device"),
+        ):
+            self.assertRaises(
+                OSError,
+                self.facade.add_channel_deb_dir,
+                deb_dir,
+            )
+        self.assertFalse(os.path.exists(packages_path + ".tmp"))
+        self.assertEqual(packages_contents, read_text_file(packages_path))
+
     def test_add_channel_deb_dir_get_packages(self):
         """
         After calling {add_channel_deb_dir} and reloading the channels,
@@ -989,6 +1033,73 @@ class AptFacadeTest(
         [pkg] = self.facade.get_packages_by_name("name2")
         self.assertEqual(HASH2, self.facade.get_package_hash(pkg))
 
+    def test_reload_channels_rehashes_changed_packages(self):
+        """
+        C{reload_channels} computes the hash again for a package version
+        whose relations changed since the previous reload.
+        """
+        deb_dir = self.makeDir()
+        self._add_package_to_deb_dir(deb_dir, "foo")
+        self.facade.add_channel_apt_deb(
+            f"file://{deb_dir}",
+            "./",
+            trusted=True,
+        )
+        self.facade.reload_channels()
+        [foo] = self.facade.get_packages_by_name("foo")
+        old_hash = self.facade.get_package_hash(foo)
+        os.remove(os.path.join(deb_dir, "Packages"))
+        self._add_package_to_deb_dir(
+            deb_dir,
+            "foo",
+            control_fields={"Depends": "bar"},
+        )
+        self._touch_packages_file(deb_dir)
+        self.facade.refetch_package_index = True
+        self.facade.reload_channels()
+        [foo] = self.facade.get_packages_by_name("foo")
+        self.assertNotEqual(old_hash, self.facade.get_package_hash(foo))
+        self.assertEqual(
+            self.facade.get_package_skeleton(foo, False).get_hash(),
+            self.facade.get_package_hash(foo),
+        )
+
+    def test_reload_channels_rehashes_case_changed_dependency(self):
+        """
+        C{reload_channels} computes the hash again for a package version
+        when only the case of a dependency's version changed, even though
+        apt's own version hash doesn't tell the two apart.
+        """
+        deb_dir = self.makeDir()
+        self._add_package_to_deb_dir(
+            deb_dir,
+            "foo",
+            control_fields={"Depends": "bar (>= 1.0a)"},
+        )
+        self.facade.add_channel_apt_deb(
+            f"file://{deb_dir}",
+            "./",
+            trusted=True,
+        )
+        self.facade.reload_channels()
+        [foo] = self.facade.get_packages_by_name("foo")
+        old_hash = self.facade.get_package_hash(foo)
+        os.remove(os.path.join(deb_dir, "Packages"))
+        self._add_package_to_deb_dir(
+            deb_dir,
+            "foo",
+            control_fields={"Depends": "bar (>= 1.0A)"},
+        )
+        self._touch_packages_file(deb_dir)
+        self.facade.refetch_package_index = True
+        self.facade.reload_channels()
+        [foo] = self.facade.get_packages_by_name("foo")
+        self.assertNotEqual(old_hash, self.facade.get_package_hash(foo))
+        self.assertEqual(
+            self.facade.get_package_skeleton(foo, False).get_hash(),
+            self.facade.get_package_hash(foo),
+        )
+
     def test_get_package_hashes(self):
         """
         C{get_package_hashes} returns the hashes for all packages in the
@@ -3595,6 +3706,46 @@ class AptFacadeTest(
             foo.package._pkg.selected_state,
         )
 
+    def test_perform_hold_changes_single_dpkg_call(self):
+        """
+        C{perform_changes} applies all the hold creations and removals
+        with a single dpkg selections call. Hold removals for packages
+        that aren't installed or aren't held are left out.
+        """
+        self._add_system_package("a")
+        self._add_system_package("b")
+        self._add_system_package(
+            "c",
+            control_fields={"Status": "hold ok installed"},
+        )
+        self._add_system_package("d")
+        deb_dir = self.makeDir()
+        self._add_package_to_deb_dir(deb_dir, "e")
+        self.facade.add_channel_apt_deb(
+            f"file://{deb_dir}",
+            "./",
+            trusted=True,
+        )
+        self.facade.reload_channels()
+        [a] = self.facade.get_packages_by_name("a")
+        [b] = self.facade.get_packages_by_name("b")
+        [c] = self.facade.get_packages_by_name("c")
+        [d] = self.facade.get_packages_by_name("d")
+        [e] = self.facade.get_packages_by_name("e")
+        self.facade.mark_hold(a)
+        self.facade.mark_hold(b)
+        self.facade.mark_remove_hold(c)
+        self.facade.mark_remove_hold(d)
+        self.facade.mark_remove_hold(e)
+        with mock.patch.object(
+            self.facade,
+            "_set_dpkg_selections",
+        ) as set_dpkg_selections:
+            self.facade.perform_changes()
+        set_dpkg_selections.assert_called_once_with(
+            "a hold\nb hold\nc install",
+        )
+
     def test_creation_of_key_ring(self):
         """
         Apt on Trusty requires a keyring exist in its directory structure, so
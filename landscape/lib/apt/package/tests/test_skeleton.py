@@ -1,9 +1,12 @@
 import unittest
+from unittest import mock
 
 from twisted.python.compat import unicode
 
 from landscape.lib import testing
+from landscape.lib.apt.package import skeleton as skeleton_module
 from landscape.lib.apt.package.skeleton import build_skeleton_apt
+from landscape.lib.apt.package.skeleton import compute_package_hash
 from landscape.lib.apt.package.skeleton import DEB_CONFLICTS
 from landscape.lib.apt.package.skeleton import DEB_NAME_PROVIDES
 from landscape.lib.apt.package.skeleton import DEB_OR_REQUIRES
@@ -35,6 +38,16 @@ from landscape.lib.apt.package.testing import PKGNAME_SIMPLE_RELATIONS
 from landscape.lib.apt.package.testing import PKGNAME_VERSION_RELATIONS
 
 
+class SortCountingList(list):
+    """A list that counts how many times it has been sorted."""
+
+    sort_calls = 0
+
+    def sort(self, *args, **kwargs):
+        self.sort_calls += 1
+        super().sort(*args, **kwargs)
+
+
 class SkeletonTestHelper:
     """A helper to set up a repository for the skeleton tests."""
 
@@ -330,6 +343,76 @@ class SkeletonAptTest(BaseTestCase):
         self.assertEqual(relations, skeleton.relations)
         self.assertEqual(HASH_OR_RELATIONS, skeleton.get_hash())
 
+    def test_compute_package_hash(self):
+        """
+        C{compute_package_hash} returns the same hash as the skeleton
+        built by C{build_skeleton_apt}, without building it.
+        """
+        expected_hashes = {
+            "name1": HASH1,
+            "minimal": HASH_MINIMAL,
+            "simple-relations": HASH_SIMPLE_RELATIONS,
+            "version-relations": HASH_VERSION_RELATIONS,
+            "multiple-relations": HASH_MULTIPLE_RELATIONS,
+            "or-relations": HASH_OR_RELATIONS,
+        }
+        for name, expected_hash in expected_hashes.items():
+            self.assertEqual(
+                expected_hash,
+                compute_package_hash(self.get_package(name)),
+            )
+
+    def test_build_skeleton_hash_without_sorting_again(self):
+        """
+        The relations of a skeleton built by C{build_skeleton_apt} are
+        already sorted, so C{get_hash} doesn't sort them again.
+        """
+        pkg1 = self.get_package("name1")
+        relations = SortCountingList(
+            skeleton_module._get_relations_apt(
+                pkg1,
+                pkg1.package.name,
+                pkg1.version,
+            ),
+        )
+        with mock.patch(
+            "landscape.lib.apt.package.skeleton._get_relations_apt",
+            return_value=relations,
+        ):
+            package_skeleton = build_skeleton_apt(pkg1)
+        self.assertIs(relations, package_skeleton.relations)
+        self.assertEqual(HASH1, package_skeleton.get_hash())
+        self.assertEqual(0, relations.sort_calls)
+
+    def test_build_skeleton_hash_with_replaced_relations(self):
+        """
+        If the relations of a skeleton built by C{build_skeleton_apt} are
+        replaced by another list, C{get_hash} sorts that list before
+        hashing it.
+        """
+        package_skeleton = build_skeleton_apt(self.get_package("name1"))
+        relations = SortCountingList(reversed(package_skeleton.relations))
+        package_skeleton.relations = relations
+        self.assertEqual(HASH1, package_skeleton.get_hash())
+        self.assertEqual(1, relations.sort_calls)
+
+    def test_build_skeleton_hash_with_added_relation(self):
+        """
+        If a relation is added to a skeleton built by
+        C{build_skeleton_apt}, C{get_hash} sorts the relations again.
+        """
+        package_skeleton = build_skeleton_apt(self.get_package("name1"))
+        package_skeleton.add_relation(DEB_PROVIDES, "aaa")
+        expected_skeleton = build_skeleton_apt(self.get_package("name1"))
+        expected_skeleton.relations = sorted(
+            expected_skeleton.relations + [(DEB_PROVIDES, "aaa")],
+        )
+        self.assertNotEqual(HASH1, package_skeleton.get_hash())
+        self.assertEqual(
+            expected_skeleton.get_hash(),
+            package_skeleton.get_hash(),
+        )
+
 
 class SkeletonTest(BaseTestCase):
     def test_skeleton_set_hash(self):